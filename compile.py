@@ -8,9 +8,10 @@ import json
 import time
 import math
 import shlex
+import hashlib
 import subprocess
 import shutil
-from PIL import Image as PILImage
+from contextlib import contextmanager
 from datetime import datetime
 import xml.etree.ElementTree as ElementTree
 
@@ -22,6 +23,35 @@ import xml.etree.ElementTree as ElementTree
 CACHE_DESTRUCTION_MOD_TIME = 1614055952
 
 
+#
+# The manifest of the files in a release build, and the diff of it against the manifest of a deployment.
+# Each deployment records the manifest it was synced from under the same name, which src/.htaccess denies access to.
+#
+DEPLOY_MANIFEST_FILE = "deploy_manifest.json"
+DEPLOY_DIFF_FILE = "./deploy_diff.json"
+
+
+#
+# The dimensions of every scaled image copy, recorded when the copies are saved.
+#
+IMAGE_METADATA_FILE = "res/image_metadata.json"
+
+
+#
+# The durations of the tasks performed in the last build of each mode, used to estimate the cost of builds.
+#
+BUILD_TIMINGS_FILE = "./build_timings.json"
+
+
+#
+# The Cache-Control headers that the Expires rules in src/.htaccess serve files with.
+# Files that are not matched by any of the rules are served without a Cache-Control header.
+#
+LONG_CACHE_EXTENSIONS = ["gif", "png", "jpg", "webp", "svg", "mp4", "ttf", "woff2", "json", "js", "css"]
+LONG_CACHE_CONTROL = "max-age=315360000"
+ICO_CACHE_CONTROL = "max-age=2592000"
+
+
 #
 # Utility Functions
 #
@@ -60,12 +90,66 @@ def get_incomplete_file_mtime(file):
     raise Exception("Could not find version of file {}".format(file))
 
 
+def get_pil_image():
+    """
+    Returns PIL's Image module. PIL is slow to import, so it is only imported
+    once images actually need to be processed, which keeps planning builds fast.
+    """
+    from PIL import Image as PILImage
+    return PILImage
+
+
 def append_size_class(path, size_class):
     if size_class == "u_u":
         return path
     return "{}.{}".format(path, size_class)
 
 
+def hash_file(file):
+    """ Returns the hex SHA-256 digest of the contents of the given file. """
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_cache_control(path):
+    """ Returns the Cache-Control header that the file at the given path is served with, or None if it has none. """
+    extension = os.path.splitext(path)[1][1:]
+    if extension in LONG_CACHE_EXTENSIONS:
+        return LONG_CACHE_CONTROL
+    if extension == "ico":
+        return ICO_CACHE_CONTROL
+    return None
+
+
+def find_rebuild_reason(source_mtime, output_file):
+    """
+    Returns why output_file needs to be rebuilt from sources last modified
+    at source_mtime, or None if it is already up-to-date.
+    """
+    output_mtime = getmtime(output_file)
+    if output_mtime == -1:
+        return "missing"
+    if output_mtime != source_mtime:
+        return "sources changed"
+    return None
+
+
+def read_json_or_default(file, default):
+    try:
+        with open(file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(file, value):
+    with open(file, 'w') as f:
+        json.dump(value, f, indent=2, sort_keys=True)
+
+
 def execute_command(*command, **kwargs):
     return execute_piped_commands(command, **kwargs)
 
@@ -230,18 +314,27 @@ class Image:
 
     def get_original(self):
         if self.original_image is None:
-            self.original_image = PILImage.open(self.from_rel)
+            self.original_image = get_pil_image().open(self.from_rel)
         return self.original_image
 
     def get_scaled(self, size):
         original = self.get_original()
         width = size.calc_width(*original.size)
         height = size.calc_height(*original.size)
-        return original.resize((width, height), PILImage.LANCZOS)
+        return original.resize((width, height), get_pil_image().LANCZOS)
 
-    def save_image_copies(self, target_folder, *, prefix=""):
-        original = self.get_original()
+    def find_rebuild_reason(self, target_folder, size_class):
+        """ Returns why the copies of the given size class need to be saved, or None if they are up-to-date. """
+        scaled_file = append_size_class(resolve_path(target_folder, self.to_rel), size_class)
+        mtime = getmtime(self.from_rel)
+        png_reason = find_rebuild_reason(mtime, scaled_file + ".png")
+        webp_reason = find_rebuild_reason(mtime, scaled_file + ".webp")
+        return png_reason if png_reason is not None else webp_reason
+
+    def save_image_copies(self, target_folder, image_metadata, *, prefix="", timings):
         mtime = getmtime(self.from_rel)
+        known_sizes = image_metadata.get(self.to_rel, mtime)
+        sizes_metadata = {}
 
         # Make sure the directory to copy the image to exists.
         output_file = resolve_path(target_folder, self.to_rel)
@@ -253,20 +346,34 @@ class Image:
             scaled_file = append_size_class(output_file, size_class)
             scaled_file_png = scaled_file + ".png"
             scaled_file_webp = scaled_file + ".webp"
-            if mtime == getmtime(scaled_file_png) and mtime == getmtime(scaled_file_webp):
+            if self.find_rebuild_reason(target_folder, size_class) is None:
+                if size_class in known_sizes:
+                    width = known_sizes[size_class]["width"]
+                    height = known_sizes[size_class]["height"]
+                else:
+                    original = self.get_original()
+                    width = size.calc_width(*original.size)
+                    height = size.calc_height(*original.size)
+
+                sizes_metadata[size_class] = {"width": width, "height": height}
                 continue
 
             # Save the scaled copies.
             quality = self.compression_quality
             lossless = (quality >= 100)
 
-            scaled_image = self.get_scaled(size)
-            scaled_image.save(scaled_file_png, lossless=lossless, quality=quality)
-            setmtime(scaled_file_png, getmtime(self.from_rel))
-            print("{}created {}".format(prefix, scaled_file_png))
-            scaled_image.save(scaled_file_webp, lossless=lossless, quality=quality)
-            setmtime(scaled_file_webp, getmtime(self.from_rel))
-            print("{}created {}".format(prefix, scaled_file_webp))
+            with timings.measure("image:{}:{}".format(self.to_rel, size_class)):
+                scaled_image = self.get_scaled(size)
+                scaled_image.save(scaled_file_png, lossless=lossless, quality=quality)
+                setmtime(scaled_file_png, getmtime(self.from_rel))
+                print("{}created {}".format(prefix, scaled_file_png))
+                scaled_image.save(scaled_file_webp, lossless=lossless, quality=quality)
+                setmtime(scaled_file_webp, getmtime(self.from_rel))
+                print("{}created {}".format(prefix, scaled_file_webp))
+
+            sizes_metadata[size_class] = {"width": scaled_image.width, "height": scaled_image.height}
+
+        image_metadata.set(self.to_rel, mtime, sizes_metadata)
 
 
 
@@ -297,11 +404,87 @@ class Annotations:
         setmtime(file, getmtime(self.source_files))
 
 
+class ImageMetadataIndex:
+    """
+    The width and height of each size class of each image.
+    Images are keyed by the URL they are requested from, without their version or extension.
+    """
+    def __init__(self, entries=None):
+        self.entries = entries if entries is not None else {}
+
+    @staticmethod
+    def to_key(to_rel):
+        return "/" + to_rel.lstrip("/")
+
+    def get(self, to_rel, mtime=None):
+        """ Returns the metadata of each size class of the image, or an empty dict if it is unknown or stale. """
+        entry = self.entries.get(ImageMetadataIndex.to_key(to_rel))
+        if entry is None or (mtime is not None and entry["mtime"] != mtime):
+            return {}
+        return entry["sizes"]
+
+    def set(self, to_rel, mtime, sizes):
+        self.entries[ImageMetadataIndex.to_key(to_rel)] = {"mtime": mtime, "sizes": sizes}
+
+    def retain(self, to_rels):
+        """ Removes the metadata of all images that are not in to_rels. """
+        keys = {ImageMetadataIndex.to_key(to_rel) for to_rel in to_rels}
+        self.entries = {key: entry for key, entry in self.entries.items() if key in keys}
+
+    def format_sizes(self, to_rel):
+        """ Formats the dimensions of each size class of the image as "u_u:764x335,u_720:218x96". """
+        sizes = self.get(to_rel)
+        return ",".join(
+            "{}:{}x{}".format(size_class, size["width"], size["height"]) for size_class, size in sizes.items()
+        )
+
+    def write(self, target_folder):
+        file = resolve_path(target_folder, IMAGE_METADATA_FILE)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, 'w') as f:
+            json.dump(self.entries, f, separators=(',', ':'))
+
+    @staticmethod
+    def read(target_folder):
+        file = resolve_path(target_folder, IMAGE_METADATA_FILE)
+        return ImageMetadataIndex(read_json_or_default(file, {}))
+
+
+class BuildTimings:
+    """
+    The durations in seconds of the tasks performed in the last build of a compilation mode.
+    """
+    def __init__(self, mode, durations=None):
+        self.mode = mode
+        self.durations = durations if durations is not None else {}
+
+    def get(self, task):
+        """ Returns the duration of the task in the last build, or None if it has not been timed. """
+        return self.durations.get(task)
+
+    @contextmanager
+    def measure(self, task):
+        start = time.time()
+        yield
+        self.durations[task] = round(time.time() - start, 3)
+
+    def write(self):
+        all_durations = read_json_or_default(BUILD_TIMINGS_FILE, {})
+        all_durations[self.mode] = self.durations
+        write_json(BUILD_TIMINGS_FILE, all_durations)
+
+    @staticmethod
+    def read(mode):
+        all_durations = read_json_or_default(BUILD_TIMINGS_FILE, {})
+        return BuildTimings(mode, all_durations.get(mode, {}))
+
+
 def create_sitemap(target_folder, comp_spec, *, prefix=""):
     """
-    Reads the sitemap template, fills in the last modified time, and outputs it.
+    Reads the sitemap template, fills in the last modified time of the HTML, and outputs it.
     """
-    date_w3c = datetime.now().strftime("%Y-%m-%d")
+    html_mtime = getmtime(list(comp_spec.html_files.keys()))
+    date_w3c = datetime.fromtimestamp(html_mtime).strftime("%Y-%m-%d")
     with open(comp_spec.sitemap_source) as source_file:
         output_sitemap = ""
         for line in source_file:
@@ -379,7 +562,7 @@ def generate_html(target_folder, comp_spec, *, prefix=""):
             print(prefix + "generated " + to_path)
 
 
-def combine_js(target_folder, comp_spec, *, prefix="", minify=False):
+def combine_js(target_folder, comp_spec, *, prefix="", minify=False, timings):
     """
     Concatenate all javascript into a single source file, and optionally minify it.
     """
@@ -387,7 +570,7 @@ def combine_js(target_folder, comp_spec, *, prefix="", minify=False):
         output_file = resolve_path(target_folder, to_rel)
         source_mtime = getmtime(file_list)
         # Skip this output if none of its sources have changed.
-        if source_mtime == getmtime(output_file):
+        if find_rebuild_reason(source_mtime, output_file) is None:
             continue
 
         commands = [
@@ -398,11 +581,12 @@ def combine_js(target_folder, comp_spec, *, prefix="", minify=False):
             commands.append(["npx", "uglifyjs", "--compress", "--mangle"])
         commands.append(output_file)
 
-        assert execute_piped_commands(*commands, prefix=prefix)
+        with timings.measure("js:" + to_rel):
+            assert execute_piped_commands(*commands, prefix=prefix)
         setmtime(output_file, source_mtime)
 
 
-def generate_css(target_folder, comp_spec, *, prefix=""):
+def generate_css(target_folder, comp_spec, *, prefix="", timings):
     """
     Minify the CSS of the website.
     """
@@ -410,21 +594,22 @@ def generate_css(target_folder, comp_spec, *, prefix=""):
         output_file = resolve_path(target_folder, to_rel)
         source_mtime = getmtime(file_list)
         # Skip this output if none of its sources have changed.
-        if source_mtime == getmtime(output_file):
+        if find_rebuild_reason(source_mtime, output_file) is None:
             continue
 
-        assert execute_piped_commands(
-            ["cat", *file_list],
-            ["npx", "postcss", "--use", "postcss-preset-env"],
-            ["npx", "postcss", "--use", "autoprefixer"],
-            ["npx", "uglifycss"],
-            output_file,
-            prefix=prefix
-        )
+        with timings.measure("css:" + to_rel):
+            assert execute_piped_commands(
+                ["cat", *file_list],
+                ["npx", "postcss", "--use", "postcss-preset-env"],
+                ["npx", "postcss", "--use", "autoprefixer"],
+                ["npx", "uglifycss"],
+                output_file,
+                prefix=prefix
+            )
         setmtime(output_file, source_mtime)
 
 
-def copy_resource_files(target_folder, comp_spec, *, prefix=""):
+def copy_resource_files(target_folder, comp_spec, *, prefix="", timings):
     """
     Copy all the resource files for the page into the target folder.
     """
@@ -435,29 +620,38 @@ def copy_resource_files(target_folder, comp_spec, *, prefix=""):
             continue
 
         os.makedirs(os.path.dirname(to_path), exist_ok=True)
-        shutil.copyfile(from_path, to_path)
+        with timings.measure("resource:" + to_rel):
+            shutil.copyfile(from_path, to_path)
         setmtime(to_path, getmtime(from_path))
         print("{}copied {}".format(prefix, to_rel))
 
-    # Copy and scale images.
+    # Copy and scale images, recording the metadata of their scaled copies.
+    image_metadata = ImageMetadataIndex.read(target_folder)
+    to_rels = []
     for from_rel, image in comp_spec.images.items():
         if image.to_rel is not None:
-            image.save_image_copies(target_folder, prefix=prefix)
+            image.save_image_copies(target_folder, image_metadata, prefix=prefix, timings=timings)
+            to_rels.append(image.to_rel)
+
+    image_metadata.retain(to_rels)
+    image_metadata.write(target_folder)
 
     # Create the favicon images.
-    favicon_image = PILImage.open("res/favicon.png")
-    favicon_path = resolve_path(target_folder, "favicon{}.ico")
-    target_sizes = [16, 32, 64, 96, 128]
-    for size in target_sizes:
-        favicon_scaled = favicon_image.resize((size, size), PILImage.LANCZOS)
-        favicon_scaled.save(
-            favicon_path.format(size), sizes=[(size, size)], lossless=True, quality=100
-        )
-        if size == max(target_sizes):
+    with timings.measure("favicons"):
+        PILImage = get_pil_image()
+        favicon_image = PILImage.open("res/favicon.png")
+        favicon_path = resolve_path(target_folder, "favicon{}.ico")
+        target_sizes = [16, 32, 64, 96, 128]
+        for size in target_sizes:
+            favicon_scaled = favicon_image.resize((size, size), PILImage.LANCZOS)
             favicon_scaled.save(
-                favicon_path.format(""), sizes=[(size, size) for size in target_sizes],
-                lossless=True, quality=100
+                favicon_path.format(size), sizes=[(size, size)], lossless=True, quality=100
             )
+            if size == max(target_sizes):
+                favicon_scaled.save(
+                    favicon_path.format(""), sizes=[(size, size) for size in target_sizes],
+                    lossless=True, quality=100
+                )
 
 
 def combine_annotations(target_folder, comp_spec, *, prefix=""):
@@ -470,7 +664,7 @@ def combine_annotations(target_folder, comp_spec, *, prefix=""):
     annotations.write(resolve_path(target_folder, "res/annotations.json"))
 
 
-def filter_file(target_folder, file, *, prefix="", skip_versions=False):
+def filter_file(target_folder, file, image_metadata, *, prefix="", skip_versions=False):
     """
     Filters through all HTML, CSS, and JS files and replaces [ver] patterns in file paths.
     :return: The filtered content of the file, and its calculated modification time.
@@ -528,18 +722,31 @@ def filter_file(target_folder, file, *, prefix="", skip_versions=False):
         is_dyn_image = (original_content[string_start - len("data-src="):string_start] == "data-src=")
         is_dyn_button = (original_content[string_start - len("data-src-active="):string_start] == "data-src-active=")
 
+        if not is_dyn_image and not is_dyn_button:
+            continue
+
+        # Find the dimensions of the full-resolution image, preferring the recorded image metadata.
+        full_size = image_metadata.get(ver_target_file).get("u_u")
+        if full_size is not None:
+            width, height = full_size["width"], full_size["height"]
+        else:
+            width, height = get_pil_image().open(incomplete_path + ".png").size
+
         # Add a placeholder SVG image to maintain the aspect ratio of dynamic images.
         if is_dyn_image:
-            image = PILImage.open(incomplete_path + ".png")
             filtered += " src=\"data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 "
-            filtered += str(image.width) + " " + str(image.height)
+            filtered += str(width) + " " + str(height)
             filtered += "'%3E%3C/svg%3E\" "
 
         # Add the width and height to preserve the aspect ratio of dynamic images and buttons.
-        if is_dyn_image or is_dyn_button:
-                image = PILImage.open(incomplete_path + ".png")
-                filtered += "width=\"" + str(image.width) + "\" "
-                filtered += "height=\"" + str(image.height) + "\""
+        filtered += "width=\"" + str(width) + "\" "
+        filtered += "height=\"" + str(height) + "\""
+
+        # Add the size of each size class so that dynamic buttons can size their canvases before loading.
+        if is_dyn_button:
+            sizes = image_metadata.format_sizes(ver_target_file)
+            if sizes != "":
+                filtered += " data-sizes=\"" + sizes + "\""
 
     return source_mtime, filtered, changed
 
@@ -557,11 +764,12 @@ def filter_files(target_folder, comp_spec, *, prefix="", skip_versions=False):
         *comp_spec.js_files.keys(),
         *comp_spec.html_files.values()
     ]
+    image_metadata = ImageMetadataIndex.read(target_folder)
     for file_rel in files_to_filter:
         # Read and filter the file.
         file_path = resolve_path(target_folder, file_rel)
         file_mtime, filtered, changed = filter_file(
-                target_folder, file_path, prefix=prefix, skip_versions=skip_versions)
+                target_folder, file_path, image_metadata, prefix=prefix, skip_versions=skip_versions)
 
         # Write the new filtered file.
         if changed:
@@ -576,8 +784,171 @@ def zip_development_res_folder(target_folder, comp_spec, *, prefix=""):
     Creates a zip file with the full contents of the development resources folder.
     """
     output_file = resolve_path(target_folder, "res.zip")
-    # For some reason the zip command never exits if shell=True is used in subprocess.Popen...
-    assert execute_command("zip", "-q", "-r", output_file, "./res", prefix=prefix)
+    # The files are sorted, and extra attributes such as access times are excluded (-X),
+    # so that the zip is identical between releases unless the resources change.
+    assert execute_piped_commands(
+        ["find", "./res", "-type", "f"],
+        ["sort"],
+        ["zip", "-q", "-X", output_file, "-@"],
+        prefix=prefix
+    )
+
+
+def create_deploy_manifest(target_folder):
+    """
+    Creates a manifest containing the content hash, size, and cache
+    headers of every file in the target folder, keyed by their paths.
+    """
+    ignored_files = [DEPLOY_MANIFEST_FILE, IMAGE_METADATA_FILE]
+    files = {}
+    for directory, _, file_names in os.walk(target_folder):
+        for file_name in file_names:
+            file_path = os.path.join(directory, file_name)
+            rel_path = os.path.relpath(file_path, target_folder).replace(os.sep, "/")
+            if rel_path in ignored_files:
+                continue
+
+            files[rel_path] = {
+                "hash": hash_file(file_path),
+                "size": os.path.getsize(file_path),
+                "cache_control": get_cache_control(rel_path)
+            }
+    return {"files": files}
+
+
+def diff_deploy_manifests(previous, current):
+    """
+    Finds the paths that have been added, changed, or removed between two deploy manifests.
+    """
+    previous_files = previous["files"]
+    current_files = current["files"]
+    added, changed, unchanged = [], [], []
+    for path, entry in current_files.items():
+        if path not in previous_files:
+            added.append(path)
+        elif previous_files[path]["hash"] != entry["hash"] \
+                or previous_files[path]["cache_control"] != entry["cache_control"]:
+            changed.append(path)
+        else:
+            unchanged.append(path)
+
+    removed = [path for path in previous_files.keys() if path not in current_files]
+    return {
+        "added": sorted(added),
+        "changed": sorted(changed),
+        "removed": sorted(removed),
+        "unchanged": len(unchanged),
+        "upload_size": sum(current_files[path]["size"] for path in added + changed)
+    }
+
+
+def generate_deploy_manifest(target_folder, comp_spec, *, prefix=""):
+    """
+    Writes the deploy manifest of the target folder.
+    """
+    manifest = create_deploy_manifest(target_folder)
+    write_json(resolve_path(target_folder, DEPLOY_MANIFEST_FILE), manifest)
+    print("{}{} files, {} bytes".format(
+        prefix, len(manifest["files"]), sum(entry["size"] for entry in manifest["files"].values())
+    ))
+
+
+def resolve_deploy_path(deploy_folder, rel_path):
+    """ Resolves rel_path within the deploy folder, and rejects it if it would resolve outside of it. """
+    deploy_folder = os.path.abspath(deploy_folder)
+    path = os.path.abspath(resolve_path(deploy_folder, rel_path))
+    if os.path.commonpath([deploy_folder, path]) != deploy_folder or path == deploy_folder:
+        raise Exception("Refusing to deploy {}, as it is outside of {}".format(rel_path, deploy_folder))
+    return path
+
+
+def remove_empty_parent_folders(path, root_folder):
+    """ Removes the folders containing path that are empty, up to but not including root_folder. """
+    root_folder = os.path.abspath(root_folder)
+    folder = os.path.dirname(os.path.abspath(path))
+    while folder != root_folder and folder.startswith(root_folder) and os.path.isdir(folder):
+        if len(os.listdir(folder)) > 0:
+            break
+        os.rmdir(folder)
+        folder = os.path.dirname(folder)
+
+
+def read_deploy_manifest(target_folder):
+    manifest_file = resolve_path(target_folder, DEPLOY_MANIFEST_FILE)
+    manifest = read_json_or_default(manifest_file, None)
+    if manifest is None:
+        raise Exception("Could not find {}, a release build is required to deploy".format(manifest_file))
+    return manifest_file, manifest
+
+
+def write_deploy_diff(target_folder, previous_manifest_file, *, prefix=""):
+    """
+    Writes the diff between the manifest of the target folder and the previously
+    deployed manifest, without copying anything. If there is no previously deployed
+    manifest, the deployment is treated as empty so that every file is uploaded.
+    """
+    manifest_file, manifest = read_deploy_manifest(target_folder)
+    previous = read_json_or_default(previous_manifest_file, None)
+    if previous is None:
+        print("{}could not find {}, treating the deployment as empty".format(prefix, previous_manifest_file))
+
+    diff = diff_deploy_manifests(previous if previous is not None else {"files": {}}, manifest)
+    # The manifests are recorded so that the diff is only applied to the deployment it was made for.
+    diff["manifest_hash"] = hash_file(manifest_file)
+    diff["previous_manifest_hash"] = None if previous is None else hash_file(previous_manifest_file)
+    write_json(DEPLOY_DIFF_FILE, diff)
+    print("{}{} added, {} changed, {} removed, {} unchanged ({} bytes to upload)".format(
+        prefix, len(diff["added"]), len(diff["changed"]), len(diff["removed"]),
+        diff["unchanged"], diff["upload_size"]
+    ))
+
+
+def sync_deploy_folder(target_folder, deploy_folder, *, prefix=""):
+    """
+    Applies the diff written by write_deploy_diff to the deploy folder,
+    and then records the manifest of the target folder in it.
+    This is a local stand-in for uploading a release build to the server.
+    """
+    manifest_file, manifest = read_deploy_manifest(target_folder)
+    diff = read_json_or_default(DEPLOY_DIFF_FILE, None)
+    if diff is None:
+        raise Exception("Could not find {}, a diff against {} is required to sync".format(DEPLOY_DIFF_FILE, deploy_folder))
+
+    # Check that the diff was made between this build and this deployment.
+    deployed_manifest_file = resolve_deploy_path(deploy_folder, DEPLOY_MANIFEST_FILE)
+    deployed_manifest_hash = hash_file(deployed_manifest_file) if os.path.exists(deployed_manifest_file) else None
+    if diff["manifest_hash"] != hash_file(manifest_file):
+        raise Exception("{} was not made from the current release build".format(DEPLOY_DIFF_FILE))
+    if diff["previous_manifest_hash"] != deployed_manifest_hash:
+        raise Exception("{} was not made against the manifest deployed in {}".format(DEPLOY_DIFF_FILE, deploy_folder))
+
+    # Check that the files to upload have not changed since the manifest was created,
+    # e.g. by a development build, and that no paths escape the deploy folder.
+    for rel_path in diff["added"] + diff["changed"]:
+        resolve_deploy_path(deploy_folder, rel_path)
+        from_path = resolve_path(target_folder, rel_path)
+        if not os.path.exists(from_path) or hash_file(from_path) != manifest["files"][rel_path]["hash"]:
+            raise Exception("{} does not match {}, a new release build is required".format(from_path, manifest_file))
+    for rel_path in diff["removed"]:
+        resolve_deploy_path(deploy_folder, rel_path)
+
+    for rel_path in diff["added"] + diff["changed"]:
+        to_path = resolve_deploy_path(deploy_folder, rel_path)
+        os.makedirs(os.path.dirname(to_path), exist_ok=True)
+        shutil.copyfile(resolve_path(target_folder, rel_path), to_path)
+        print("{}uploaded {}".format(prefix, rel_path))
+
+    for rel_path in diff["removed"]:
+        to_path = resolve_deploy_path(deploy_folder, rel_path)
+        if os.path.exists(to_path):
+            os.remove(to_path)
+        remove_empty_parent_folders(to_path, deploy_folder)
+        print("{}removed {}".format(prefix, rel_path))
+
+    # The manifest is recorded last, so that an interrupted sync is redone in full next time.
+    os.makedirs(deploy_folder, exist_ok=True)
+    shutil.copyfile(manifest_file, deployed_manifest_file)
+    os.remove(DEPLOY_DIFF_FILE)
 
 
 def download_development_res_folder(*, prefix=""):
@@ -593,6 +964,14 @@ def download_development_res_folder(*, prefix=""):
         assert execute_command("rm", "-f", "./res.zip", prefix=prefix)
 
 
+def is_res_folder_missing():
+    return not os.path.exists("./res")
+
+
+def are_dependencies_missing():
+    return not os.path.exists("./node_modules")
+
+
 def install_dependencies(*, prefix=""):
     """
     Installs the NPM dependencies required for this script to run.
@@ -608,41 +987,167 @@ def install_dependencies(*, prefix=""):
 def create_release_build(target_folder):
     print("\nCompiling Release Build")
     comp_spec = CompilationSpec.read("compilation.json")
+    timings = BuildTimings.read("release")
     print("\n1. Create a Sitemap")
-    create_sitemap(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("sitemap"):
+        create_sitemap(target_folder, comp_spec, prefix=" .. ")
     print("\n2. Generate HTML")
-    generate_html(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("html"):
+        generate_html(target_folder, comp_spec, prefix=" .. ")
     print("\n3. Combine & Minify Javascript")
-    combine_js(target_folder, comp_spec, prefix=" .. ", minify=True)
+    combine_js(target_folder, comp_spec, prefix=" .. ", minify=True, timings=timings)
     print("\n4. Minify CSS")
-    generate_css(target_folder, comp_spec, prefix=" .. ")
+    generate_css(target_folder, comp_spec, prefix=" .. ", timings=timings)
     print("\n5. Copy Resource Files")
-    copy_resource_files(target_folder, comp_spec, prefix=" .. ")
+    copy_resource_files(target_folder, comp_spec, prefix=" .. ", timings=timings)
     print("\n6. Create Annotations File")
-    combine_annotations(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("annotations"):
+        combine_annotations(target_folder, comp_spec, prefix=" .. ")
     print("\n7. Perform File Filtering")
-    filter_files(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("filter"):
+        filter_files(target_folder, comp_spec, prefix=" .. ")
     print("\n8. Zip Development Resources Folder")
-    zip_development_res_folder(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("zip"):
+        zip_development_res_folder(target_folder, comp_spec, prefix=" .. ")
+    print("\n9. Create Deploy Manifest")
+    with timings.measure("deploy_manifest"):
+        generate_deploy_manifest(target_folder, comp_spec, prefix=" .. ")
+    timings.write()
 
 
 def create_dev_build(target_folder):
     print("\nCompiling Development Build")
     comp_spec = CompilationSpec.read("compilation.json")
+    timings = BuildTimings.read("dev")
     print("\n1. Create a Sitemap")
-    create_sitemap(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("sitemap"):
+        create_sitemap(target_folder, comp_spec, prefix=" .. ")
     print("\n2. Generate HTML")
-    generate_html(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("html"):
+        generate_html(target_folder, comp_spec, prefix=" .. ")
     print("\n3. Combine Javascript")
-    combine_js(target_folder, comp_spec, prefix=" .. ")
+    combine_js(target_folder, comp_spec, prefix=" .. ", timings=timings)
     print("\n4. Minify CSS")
-    generate_css(target_folder, comp_spec, prefix=" .. ")
+    generate_css(target_folder, comp_spec, prefix=" .. ", timings=timings)
     print("\n5. Copy Resource Files")
-    copy_resource_files(target_folder, comp_spec, prefix=" .. ")
+    copy_resource_files(target_folder, comp_spec, prefix=" .. ", timings=timings)
     print("\n6. Create Annotations File")
-    combine_annotations(target_folder, comp_spec, prefix=" .. ")
+    with timings.measure("annotations"):
+        combine_annotations(target_folder, comp_spec, prefix=" .. ")
     print("\n7. Perform File Filtering")
-    filter_files(target_folder, comp_spec, prefix=" .. ", skip_versions=True)
+    with timings.measure("filter"):
+        filter_files(target_folder, comp_spec, prefix=" .. ", skip_versions=True)
+    timings.write()
+
+
+class PlannedTask:
+    def __init__(self, task, description, reason):
+        self.task = task
+        self.description = description
+        self.reason = reason
+
+
+def plan_build(target_folder, comp_spec, mode):
+    """
+    Evaluates the up-to-date checks of every stage of a build without writing
+    anything, and returns the tasks that would be performed in each stage.
+    """
+    cleaned = (mode == "release")
+    always = "always performed"
+
+    preparation_tasks = []
+    if is_res_folder_missing():
+        preparation_tasks.append(PlannedTask("download_res", "download ./res from royalur.net", "missing"))
+    if are_dependencies_missing():
+        preparation_tasks.append(PlannedTask("npm_install", "npm install", "./node_modules is missing"))
+    if cleaned:
+        preparation_tasks.append(PlannedTask("clean", "clean " + target_folder, "release builds are clean"))
+
+    def find_reason(reason):
+        return "target folder is cleaned" if cleaned else reason
+
+    html_files = []
+    for from_path, to_rel in comp_spec.html_files.items():
+        if filter_html(from_path)[2]:
+            html_files.append(to_rel)
+
+    js_tasks = []
+    for to_rel, file_list in comp_spec.js_files.items():
+        reason = find_rebuild_reason(getmtime(file_list), resolve_path(target_folder, to_rel))
+        if cleaned or reason is not None:
+            js_tasks.append(PlannedTask("js:" + to_rel, to_rel, find_reason(reason)))
+
+    css_tasks = []
+    for to_rel, file_list in comp_spec.css_files.items():
+        reason = find_rebuild_reason(getmtime(file_list), resolve_path(target_folder, to_rel))
+        if cleaned or reason is not None:
+            css_tasks.append(PlannedTask("css:" + to_rel, to_rel, find_reason(reason)))
+
+    resource_tasks = []
+    for from_path, to_rel in comp_spec.res_files.items():
+        to_mtime = getmtime(resolve_path(target_folder, to_rel))
+        if cleaned or getmtime(from_path) > to_mtime:
+            reason = find_reason("missing" if to_mtime == -1 else "source changed")
+            resource_tasks.append(PlannedTask("resource:" + to_rel, to_rel, reason))
+
+    for from_rel, image in comp_spec.images.items():
+        if image.to_rel is None:
+            continue
+        for size_class in image.sizes.keys():
+            reason = image.find_rebuild_reason(target_folder, size_class)
+            if cleaned or reason is not None:
+                task = "image:{}:{}".format(image.to_rel, size_class)
+                description = append_size_class(image.to_rel, size_class) + ".{png,webp}"
+                resource_tasks.append(PlannedTask(task, description, find_reason(reason)))
+    resource_tasks.append(PlannedTask("favicons", "favicon*.ico", always))
+
+    stages = [
+        ("Prepare Compilation", preparation_tasks),
+        ("Create a Sitemap", [PlannedTask("sitemap", comp_spec.sitemap_dest, always)]),
+        ("Generate HTML", [PlannedTask("html", "{} HTML files with includes".format(len(html_files)), always)]),
+        ("Combine & Minify Javascript" if mode == "release" else "Combine Javascript", js_tasks),
+        ("Minify CSS", css_tasks),
+        ("Copy Resource Files", resource_tasks),
+        ("Create Annotations File", [PlannedTask("annotations", "res/annotations.json", always)]),
+        ("Perform File Filtering", [PlannedTask("filter", "[ver] patterns in HTML, CSS, and JS", always)])
+    ]
+    if mode == "release":
+        stages.append(("Zip Development Resources Folder", [PlannedTask("zip", "res.zip", always)]))
+        stages.append(("Create Deploy Manifest", [PlannedTask("deploy_manifest", DEPLOY_MANIFEST_FILE, always)]))
+    return stages
+
+
+def print_build_plan(target_folder, mode):
+    """
+    Prints the tasks that a build would perform, and estimates
+    of their durations based upon the timings of the last build.
+    """
+    print("\nPlanning {} Build".format("Release" if mode == "release" else "Development"))
+    comp_spec = CompilationSpec.read("compilation.json")
+    timings = BuildTimings.read(mode)
+
+    total_duration = 0
+    task_count = 0
+    untimed_count = 0
+    # The preparation is numbered 0, so that the numbers of the other stages match those printed by builds.
+    for index, (name, tasks) in enumerate(plan_build(target_folder, comp_spec, mode)):
+        print("\n{}. {}".format(index, name))
+        if len(tasks) == 0:
+            print(" .. up-to-date")
+        for task in tasks:
+            duration = timings.get(task.task)
+            estimate = "unknown" if duration is None else "~{:.2f}s".format(duration)
+            print(" .. {} ({}, {})".format(task.description, task.reason, estimate))
+
+            task_count += 1
+            if duration is None:
+                untimed_count += 1
+            else:
+                total_duration += duration
+
+    print("\nEstimated duration of {} tasks: ~{:.1f}s".format(task_count, total_duration))
+    if untimed_count > 0:
+        print("{} tasks have no timings from a previous {} build".format(untimed_count, mode))
 
 
 
@@ -653,6 +1158,9 @@ def exit_with_usage():
     """ Prints the program help and then exits. """
     print("Usage:")
     print("  python -m compile [clean] <clean:dev:release>")
+    print("  python -m compile plan <dev:release>")
+    print("  python -m compile diff <previously deployed manifest>")
+    print("  python -m compile sync <deploy directory>")
     sys.exit(1)
 
 
@@ -665,6 +1173,32 @@ if __name__ == "__main__":
     mode = sys.argv[1]
     do_clean = (mode == "clean" or mode == "release")
     target_folder = "./dist"
+
+    # Diffing and syncing only use an existing release build, so they need none of the compilation preparation.
+    if mode == "diff":
+        if arg_count != 3:
+            exit_with_usage()
+        print("\nDiffing " + target_folder + " against " + sys.argv[2] + "...")
+        write_deploy_diff(target_folder, sys.argv[2], prefix=" .. ")
+        print("\nDone!\n")
+        sys.exit(0)
+
+    if mode == "sync":
+        if arg_count != 3:
+            exit_with_usage()
+        print("\nSyncing " + target_folder + " to " + sys.argv[2] + "...")
+        sync_deploy_folder(target_folder, sys.argv[2], prefix=" .. ")
+        print("\nDone!\n")
+        sys.exit(0)
+
+    # Planning only inspects the target directory, so it needs none of the compilation preparation.
+    if mode == "plan":
+        if arg_count != 3 or (sys.argv[2] != "dev" and sys.argv[2] != "release"):
+            exit_with_usage()
+        print_build_plan(target_folder, sys.argv[2])
+        print("")
+        sys.exit(0)
+
     if arg_count == 3:
         if mode != "clean":
             exit_with_usage()
@@ -675,10 +1209,14 @@ if __name__ == "__main__":
         print("Invalid compilation mode:", mode)
         exit_with_usage()
 
+    # The durations of the preparation are recorded so that they can be included in plans.
+    preparation_timings = BuildTimings.read(mode)
+
     # Download the resources folder if it doesn't exist.
-    if not os.path.exists("./res"):
+    if is_res_folder_missing():
         print("\nCould not find ./res directory, attempting to download it...")
-        download_development_res_folder(prefix=" .. ")
+        with preparation_timings.measure("download_res"):
+            download_development_res_folder(prefix=" .. ")
 
     # Create the target directory if it doesn't already exist.
     if not do_clean and not os.path.exists(target_folder):
@@ -686,15 +1224,18 @@ if __name__ == "__main__":
         os.mkdir(target_folder)
 
     # Install the NPM dependencies if they are not already installed.
-    if not os.path.exists("./node_modules"):
+    if are_dependencies_missing():
         print("\nDetected missing NPM dependencies as ./node_modules is missing, installing them...")
-        install_dependencies(prefix=" .. ")
+        with preparation_timings.measure("npm_install"):
+            install_dependencies(prefix=" .. ")
 
     # If needed, perform a clean of the target directory.
     if do_clean:
         print("\nCleaning the target directory " + target_folder + "...")
-        shutil.rmtree(target_folder)
-        os.makedirs(target_folder)
+        with preparation_timings.measure("clean"):
+            shutil.rmtree(target_folder)
+            os.makedirs(target_folder)
+    preparation_timings.write()
 
     # Start the compilation.
     if mode == "release":
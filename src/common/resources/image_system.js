@@ -62,17 +62,23 @@ ImageSystem.prototype.loadDynamicButtons = function() {
     for (let index = 0; index < canvases.length; ++index) {
         const canvas = canvases[index],
               dynamicSrcInactive = canvas.getAttribute("data-src-inactive"),
-              dynamicSrcActive = canvas.getAttribute("data-src-active");
+              dynamicSrcActive = canvas.getAttribute("data-src-active"),
+              dynamicSizes = canvas.getAttribute("data-sizes");
 
         if (!dynamicSrcInactive || !dynamicSrcActive)
             continue;
 
         canvas.removeAttribute("data-src-inactive");
         canvas.removeAttribute("data-src-active");
+        if (dynamicSizes) {
+            canvas.removeAttribute("data-sizes");
+            this.resourceLoader.addImageMetadata(dynamicSrcActive, parseImageSizes(dynamicSizes));
+        }
+        const size = this.resourceLoader.getImageMetadata(dynamicSrcActive);
 
         this.resourceLoader.completeRasterImageURL(dynamicSrcInactive, function(srcInactive) {
             this.resourceLoader.completeRasterImageURL(dynamicSrcActive, function(srcActive) {
-                const button = new DynamicButton(canvas, srcInactive, srcActive);
+                const button = new DynamicButton(canvas, srcInactive, srcActive, size);
                 this.dynamicButtons.push(button);
             }.bind(this));
         }.bind(this));
@@ -90,12 +96,31 @@ ImageSystem.prototype._redrawDynamicButtonsLoop = function() {
     window.requestAnimationFrame(() => this._redrawDynamicButtonsLoop());
 };
 
+/** Parses sizes of the form "u_u:764x335,u_720:218x96" into the width and height of each size class. **/
+function parseImageSizes(sizesText) {
+    const sizes = {},
+          entries = sizesText.split(",");
+    for (let index = 0; index < entries.length; ++index) {
+        const entry = entries[index].split(":"),
+              dimensions = entry[1].split("x");
+        sizes[entry[0]] = {width: parseInt(dimensions[0]), height: parseInt(dimensions[1])};
+    }
+    return sizes;
+}
 
-function DynamicButton(canvas, src, srcHover) {
+
+function DynamicButton(canvas, src, srcHover, size) {
     this.__class_name__ = "DynamicButton";
     this.canvas = canvas;
     this.ctx = canvas.getContext("2d");
 
+    // If the size of the images is known, the canvas can be sized before they load.
+    this.size = (size ? size : null);
+    if (this.size) {
+        canvas.width = this.size.width;
+        canvas.height = this.size.height;
+    }
+
     this.hovered = false;
     canvas.addEventListener("mouseover", this.onMouseOver.bind(this));
     canvas.addEventListener("mouseout", this.onMouseOut.bind(this));
@@ -121,6 +146,11 @@ DynamicButton.prototype.onMouseOut = function() {
     this.hovered = false;
 };
 DynamicButton.prototype.resize = function() {
+    if (this.size) {
+        this.forceRedraw();
+        return;
+    }
+
     let width = -1,
         height = -1;
 
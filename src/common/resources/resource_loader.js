@@ -25,6 +25,9 @@ function ResourceLoader(stagedResources) {
     this.resolutions = ["u_720", "u_1080", "u_1440", "u_2160", this.max_resolution];
     this.resolution = this.calculateResolution();
 
+    // The dimensions of images in each resolution, embedded in the page at compile time.
+    this.imageMetadata = {};
+
     // Organise all of the resources to be loaded.
     this.loadingStage = -1;
     this.stagedResources = (stagedResources ? stagedResources : null);
@@ -64,6 +67,20 @@ ResourceLoader.prototype.completeRasterImageURL = function(url, callback, skipRe
         callback(url + size + (ext.length ? "." + ext : ""));
     }.bind(this));
 }
+/** Versions are not included in the keys of the image metadata. **/
+ResourceLoader.prototype._getImageMetadataKey = function(url) {
+    return url.replace(/\.(v[0-9]+|\[ver\])$/, "");
+};
+ResourceLoader.prototype.addImageMetadata = function(url, sizes) {
+    this.imageMetadata[this._getImageMetadataKey(url)] = sizes;
+};
+/** Finds the width and height of the image at url in the current resolution. **/
+ResourceLoader.prototype.getImageMetadata = function(url) {
+    const sizes = this.imageMetadata[this._getImageMetadataKey(url)];
+    if (!sizes)
+        return null;
+    return getOrDefault(sizes, this.resolution, getOrDefault(sizes, this.max_resolution, null));
+};
 /** We normalise screen sizes to landscape-oriented, and apply the device scaling. **/
 ResourceLoader.prototype.getEffectiveScreenSize = function() {
     const width = document.documentElement.clientWidth,